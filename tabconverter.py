@@ -3,36 +3,53 @@
 
 import argparse
 import json
+import math
 import re
 import sys
 from pathlib import Path
-from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
 
 
 NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+_NOTE_TO_SEMI = {note: i for i, note in enumerate(NOTES)}
+# Flats name the sharp one semitone below their letter (Cb -> B, Fb -> E)
+_FLAT_TO_SHARP = {note + 'b': NOTES[(i - 1) % 12]
+                  for i, note in enumerate(NOTES) if len(note) == 1}
 
+# Precompiled patterns for note names and tab lines (tab line patterns
+# allow leading whitespace so lines can be matched without stripping)
+_NOTE_RE = re.compile(r'^([A-G][#b]?)(\d+)$')
+# A labelled tab line; 'octave' is only set when the label names a full
+# note (E2|---), which is what tuning detection looks for
+_TAB_LINE_RE = re.compile(r'^\s*(?P<label>[A-G][#b]?(?P<octave>\d+)?)\|')
+# Runs of digits in tab content; each run is one (possibly multi-digit) fret
+_FRET_RE = re.compile(r'\d+')
+# Fret tokens accepted from source tabs (0-24), pre-parsed to skip int()
+_FRET_VALUES = {str(fret): fret for fret in range(25)}
+# Translation table dropping octave digits from note labels (E4 -> E)
+_DIGIT_DELETE = str.maketrans('', '', '0123456789')
 
+
+@lru_cache(maxsize=128)
 def note_to_semitones(note):
     """Convert note name to semitone offset from C."""
     note = note.strip()
-    match = re.match(r'^([A-G][#b]?)(\d+)$', note)
+    match = _NOTE_RE.match(note)
     if not match:
         raise ValueError(f"Invalid note format: {note}")
     
     note_name, octave = match.groups()
     octave = int(octave)
     
-    # Handle flats - preserve lowercase b
-    if 'b' in note_name:
-        base_note = note_name[0].upper()
-        note_name = NOTES[(NOTES.index(base_note) - 1) % 12]
-    else:
-        note_name = note_name.upper()
+    # Handle flats by their sharp equivalent
+    note_name = _FLAT_TO_SHARP.get(note_name, note_name)
     
-    if note_name not in NOTES:
+    semitone = _NOTE_TO_SEMI.get(note_name)
+    if semitone is None:
         raise ValueError(f"Invalid note: {note_name}")
     
-    return NOTES.index(note_name) + (octave * 12)
+    return semitone + (octave * 12)
 
 
 def semitones_to_note(semitones):
@@ -42,9 +59,15 @@ def semitones_to_note(semitones):
     return f"{note}{octave}"
 
 
+@lru_cache(maxsize=16)
+def _parse_tuning_cached(tuning):
+    """Parse a tuple of note strings; cached since tunings are reused heavily."""
+    return tuple(note_to_semitones(note) for note in tuning)
+
+
 def parse_tuning(tuning):
     """Parse tuning from list of note strings to semitone offsets."""
-    return [note_to_semitones(note) for note in tuning]
+    return _parse_tuning_cached(tuple(tuning))
 
 
 def load_config(config_path):
@@ -59,16 +82,20 @@ def load_config(config_path):
 
 
 def detect_source_tuning(tab_lines):
-    """Extract source tuning from tab file if present."""
+    """Extract source tuning from tab file if present.
+    
+    tab_lines may be any iterable of lines, including an open file; at most
+    the first 50 lines are consumed, so a file never has to be read in full
+    just to find its tuning.
+    """
     # Look for tuning in first few lines (format: E|---, A|---, etc.)
-    tuning_pattern = re.compile(r'^([A-G][#b]?\d+)\|')
     tuning = []
     seen = set()
     
-    for line in tab_lines[:50]:  # Check first 50 lines
-        match = tuning_pattern.match(line.strip())
-        if match:
-            note = match.group(1)
+    for line in islice(tab_lines, 50):  # Check first 50 lines
+        match = _TAB_LINE_RE.match(line) if '|' in line else None
+        if match and match.group('octave'):
+            note = match.group('label')
             if note not in seen:
                 tuning.append(note)
                 seen.add(note)
@@ -80,103 +107,95 @@ def detect_source_tuning(tab_lines):
 
 
 def parse_tab_file(file_path):
-    """Parse tab file and extract tuning and tab lines."""
-    with open(file_path) as f:
-        lines = [line.rstrip('\n') for line in f]
+    """Parse tab file and extract tuning and tab sections.
     
-    source_tuning = detect_source_tuning(lines)
+    The file is read once: the first lines are kept for tuning detection and
+    tab lines are grouped into sections (runs of consecutive tab lines) as
+    they are read, so no other text is held in memory.
     
-    # Find tab sections (lines with pipe and dashes/numbers)
-    tab_pattern = re.compile(r'[A-G][#b]?\d*\|[\d\-hpbr/\\~\|]+')
-    tab_lines = []
+    Returns: (source_tuning, sections), where sections is a list of lists
+             of tab lines
+    """
+    head = []
+    sections = []
+    current_section_lines = []
+    
+    with open(file_path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if len(head) < 50:
+                head.append(line)
+            
+            match = _TAB_LINE_RE.match(line) if '|' in line else None
+            if match:
+                current_section_lines.append(line)
+            elif current_section_lines:
+                # Non-tab line - end current section
+                sections.append(current_section_lines)
+                current_section_lines = []
     
-    for line in lines:
-        if tab_pattern.match(line.strip()):
-            tab_lines.append(line)
+    if current_section_lines:
+        sections.append(current_section_lines)
     
-    return source_tuning, lines, tab_lines
+    return detect_source_tuning(head), sections
 
 
-def extract_note_events(lines, source_tuning, verbosity=0):
+def extract_note_events(sections_raw, source_tuning, verbosity=0):
     """Extract note events with their temporal positions (column indices).
     
+    Args:
+        sections_raw: Tab sections as returned by parse_tab_file
+        source_tuning: List of source tuning notes, matched against line labels
+        verbosity: Debug output level
+    
     Returns: List of sections, where each section is a dict mapping
              (column_idx, source_string_idx) -> fret_number
     """
     source_semi = parse_tuning(source_tuning)
-    tab_pattern = re.compile(r'^([A-G][#b]?\d*)\|')
-    
-    # First, identify all tab line groups (sections)
-    sections_raw = []
-    current_section_lines = []
-    
-    if verbosity >= 3:
-        print(f"  Scanning {len(lines)} lines for tab sections...")
     
-    for line in lines:
-        match = tab_pattern.match(line.strip())
-        if match:
-            current_section_lines.append(line)
-            if verbosity >= 3 and len(current_section_lines) <= 2:
-                print(f"    Found tab line: {line[:60]}...")
-        else:
-            # Non-tab line - end current section
-            if current_section_lines:
-                if verbosity >= 3:
-                    print(f"    Section ended with {len(current_section_lines)} lines")
-                sections_raw.append(current_section_lines)
-                current_section_lines = []
-    
-    if current_section_lines:
-        if verbosity >= 3:
-            print(f"    Final section with {len(current_section_lines)} lines")
-        sections_raw.append(current_section_lines)
+    # Map each accepted label, with or without octave number, to its source
+    # string; setdefault keeps the first string when labels repeat
+    label_to_idx = {}
+    for i, tuning_note in enumerate(source_tuning):
+        label_to_idx.setdefault(tuning_note, i)
+        label_to_idx.setdefault(tuning_note.translate(_DIGIT_DELETE), i)
     
-    # Now parse each section
     sections = []
     
+    if verbosity >= 3:
+        print(f"  Parsing {len(sections_raw)} tab sections...")
+    
     for section_lines in sections_raw:
+        if verbosity >= 3:
+            for line in section_lines[:2]:
+                print(f"    Found tab line: {line[:60]}...")
+            print(f"    Section with {len(section_lines)} lines")
+        
         section_events = {}
         
         for line in section_lines:
-            parts = line.split('|', 1)
-            if len(parts) != 2:
-                continue
-            
-            note_label, content = parts
+            # Section lines always contain a pipe (they matched _TAB_LINE_RE)
+            note_label, _, content = line.partition('|')
             note_label = note_label.strip()
             
             # Find which source string this is by matching the full note label
-            string_idx = None
-            for i, tuning_note in enumerate(source_tuning):
-                # Match either with or without octave number
-                if note_label == tuning_note or note_label == re.sub(r'\d+', '', tuning_note):
-                    string_idx = i
-                    break
+            string_idx = label_to_idx.get(note_label)
             
             if string_idx is None:
                 if verbosity >= 3:
                     print(f"    Warning: Could not match note label '{note_label}' to tuning {source_tuning}")
                 continue
             
-            # Extract notes at each column position
-            i = 0
-            while i < len(content):
-                if content[i].isdigit():
-                    # Handle multi-digit frets
-                    num_str = content[i]
-                    j = i + 1
-                    while j < len(content) and content[j].isdigit():
-                        num_str += content[j]
-                        j += 1
-                    
-                    fret = int(num_str)
-                    # Only accept reasonable fret numbers (0-24)
-                    if fret <= 24:
-                        section_events[(i, string_idx)] = fret
-                    i = j
-                else:
-                    i += 1
+            # Extract notes at each column position (multi-digit frets
+            # are matched as a single run starting at their first column)
+            for fret_match in _FRET_RE.finditer(content):
+                token = fret_match.group()
+                fret = _FRET_VALUES.get(token)
+                if fret is None:
+                    fret = int(token)  # Out of range or zero-padded ('07')
+                # Only accept reasonable fret numbers (0-24)
+                if fret <= 24:
+                    section_events[(fret_match.start(), string_idx)] = fret
         
         if section_events:
             sections.append(section_events)
@@ -184,15 +203,44 @@ def extract_note_events(lines, source_tuning, verbosity=0):
     return sections
 
 
-def find_best_target_string(note_pitch, part_type, target_tuning, occupied_strings, 
+def _separation_mask(frets, hand_separation, max_fret):
+    """Bitmask of the frets that are too close to any of the given frets.
+    
+    Bit N is set when fret N is within hand_separation of one of frets,
+    i.e. abs(N - fret) < hand_separation, so a candidate can be tested
+    against the other hand with a single shift and AND. Only bits 0 to
+    max_fret are guaranteed; no candidate fret lies outside that range.
+    """
+    # Largest whole-fret distance that still collides (config may be a
+    # float). Frets on the neck are at most max_fret apart, so a larger
+    # separation, including Infinity from the config, blocks them all
+    if hand_separation > max_fret:
+        reach = max_fret
+    elif hand_separation > 0:
+        reach = math.ceil(hand_separation) - 1
+    else:
+        return 0  # Zero, negative or NaN never collides
+    if reach < 0:
+        return 0
+    
+    window = (1 << (2 * reach + 1)) - 1
+    mask = 0
+    for fret in frets:
+        low = fret - reach
+        mask |= window << low if low >= 0 else window >> -low
+    return mask
+
+
+def find_best_target_string(note_pitch, part_type, target_semi, occupied_mask, 
                             config, other_hand_frets=None, prefer_melody_strings=True):
     """Find the best target string for a note considering all constraints.
     
     Args:
         note_pitch: Absolute pitch of the note in semitones
         part_type: 'bass' or 'melody'
-        target_tuning: List of target tuning notes
-        occupied_strings: Set of string indices already used at this timestamp
+        target_semi: Target tuning as semitone offsets (see parse_tuning)
+        occupied_mask: Bitmask of string indices already used at this timestamp
+            (bit i set means string i is taken)
         config: Config dict with fret constraints
         other_hand_frets: Dict of {string_idx: fret} for the other hand at this timestamp
         prefer_melody_strings: If True, prefer melody strings for melody parts
@@ -200,10 +248,19 @@ def find_best_target_string(note_pitch, part_type, target_tuning, occupied_strin
     Returns:
         (target_string_idx, fret) or (None, None) if impossible
     """
-    target_semi = parse_tuning(target_tuning)
-    num_strings = len(target_semi)
-    melody_start = num_strings // 2
+    placement = _placement_constraints(part_type, config, other_hand_frets)
+    return _score_candidates(note_pitch, tuple(target_semi), occupied_mask, *placement)
+
+
+def _placement_constraints(part_type, config, other_hand_frets):
+    """Resolve the config-dependent arguments of _score_candidates.
+    
+    They only depend on the hand and the other hand's frets, so a note can
+    resolve them once and reuse them for every octave it tries.
     
+    Returns:
+        (blocked_frets, fret_min, fret_max, max_fret, prefer_low_strings)
+    """
     max_fret = config.get('max_fret', 24)
     hand_separation = config.get('hand_separation', 4)
     
@@ -216,67 +273,75 @@ def find_best_target_string(note_pitch, part_type, target_tuning, occupied_strin
         fret_max = max_fret
         prefer_low_strings = False
     
-    candidates = []
+    # Only the other hand's frets matter for separation, not their strings
+    if other_hand_frets:
+        blocked_frets = _separation_mask(other_hand_frets.values(), hand_separation, max_fret)
+    else:
+        blocked_frets = 0
+    
+    return blocked_frets, fret_min, fret_max, max_fret, prefer_low_strings
+
+
+@lru_cache(maxsize=4096)
+def _score_candidates(note_pitch, target_semi, occupied_mask, blocked_frets,
+                      fret_min, fret_max, max_fret, prefer_low_strings):
+    """Cached core of find_best_target_string, taking only hashable arguments.
+    
+    The same notes and chord shapes recur throughout a tab, so identical
+    lookups (same pitch, occupied strings and other-hand frets) are common.
+    """
+    num_strings = len(target_semi)
+    melody_start = num_strings // 2
+    
+    # The basic and hand-specific fret ranges combine into a single window
+    lowest_fret = max(0, fret_min)
+    highest_fret = min(max_fret, fret_max)
+    
+    # Prefer frets in the middle of the allowed range (easier to play)
+    fret_center = (fret_min + fret_max) / 2
+    
+    # Best candidate so far; strings are tried in index order and only a
+    # strictly lower score replaces it, so ties keep the lowest index
+    best_score = None
+    best_idx = None
+    best_fret = None
     
     # Try all target strings
     for tgt_idx in range(num_strings):
-        if tgt_idx in occupied_strings:
+        if occupied_mask >> tgt_idx & 1:
             continue
         
         tgt_pitch = target_semi[tgt_idx]
         fret = note_pitch - tgt_pitch
         
-        # Check basic fret range
-        if fret < 0 or fret > max_fret:
+        # Check basic and hand-specific fret range
+        if fret < lowest_fret or fret > highest_fret:
             continue
         
-        # Check hand-specific fret range
-        if fret < fret_min or fret > fret_max:
+        # Check hand separation constraint (frets too close to the other hand)
+        if blocked_frets >> fret & 1:
             continue
         
-        # Check hand separation constraint
-        if other_hand_frets:
-            collision = False
-            for other_string, other_fret in other_hand_frets.items():
-                # Check if frets are too close (within hand_separation)
-                if abs(fret - other_fret) < hand_separation:
-                    collision = True
-                    break
-            if collision:
-                continue
-        
         # Calculate preference score (lower is better)
         is_melody_string = tgt_idx >= melody_start
         
-        # Strong preference for staying in the appropriate string region
-        if prefer_low_strings and not is_melody_string:
-            region_penalty = 0  # Bass strongly prefers bass strings
-        elif prefer_low_strings and is_melody_string:
-            region_penalty = 100  # Bass should avoid melody strings (heavy penalty)
-        elif not prefer_low_strings and is_melody_string:
-            region_penalty = 0  # Melody strongly prefers melody strings
-        elif not prefer_low_strings and not is_melody_string:
-            region_penalty = 100  # Melody should avoid bass strings (heavy penalty)
-        else:
-            region_penalty = 0
+        # Strong preference for staying in the appropriate string region:
+        # bass should avoid melody strings and melody should avoid bass
+        # strings (heavy penalty)
+        region_penalty = 100 if is_melody_string == prefer_low_strings else 0
         
-        # Prefer frets in the middle of the allowed range (easier to play)
-        fret_center = (fret_min + fret_max) / 2
         fret_penalty = abs(fret - fret_center) * 0.1
         
         score = region_penalty + fret_penalty
-        candidates.append((score, tgt_idx, fret))
+        if best_score is None or score < best_score:
+            best_score = score
+            best_idx = tgt_idx
+            best_fret = fret
     
-    if not candidates:
-        return None, None
-    
-    # Return best candidate
-    candidates.sort()
-    _, best_idx, best_fret = candidates[0]
     return best_idx, best_fret
 
 
-def try_octave_shifts(note_pitch, part_type, target_tuning, occupied_strings, 
+def try_octave_shifts(note_pitch, part_type, target_semi, occupied_mask, 
                      config, other_hand_frets=None, prefer_melody_strings=True):
     """Try finding a playable position by shifting octaves.
     
@@ -288,52 +353,93 @@ def try_octave_shifts(note_pitch, part_type, target_tuning, occupied_strings,
     5. ±1 octave in any region (fallback)
     6. ±2 octaves in any region (fallback)
     
+    Takes the same arguments as find_best_target_string.
+    
     Returns:
         (target_string_idx, fret) or (None, None) if impossible
     """
-    target_semi = parse_tuning(target_tuning)
     melody_start = len(target_semi) // 2
     prefer_low = (part_type == 'bass')
     
+    # Constraints are the same for every octave tried, so resolve them once
+    target_semi = tuple(target_semi)
+    placement = _placement_constraints(part_type, config, other_hand_frets)
+    
     # Try current octave in preferred region first
-    result = find_best_target_string(note_pitch, part_type, target_tuning, 
-                                     occupied_strings, config, other_hand_frets, 
-                                     prefer_melody_strings)
+    result = _score_candidates(note_pitch, target_semi, occupied_mask, *placement)
     if result[0] is not None:
-        # Check if we stayed in preferred region
-        is_melody_string = result[0] >= melody_start
-        
-        # Accept if in preferred region
-        if (prefer_low and not is_melody_string) or (not prefer_low and is_melody_string):
+        # Accept if we stayed in preferred region
+        if (result[0] >= melody_start) != prefer_low:
             return result
     
     # Try octave shifts in preferred region before accepting wrong region
+    shifted_results = []
     for octave_shift in [12, -12, 24, -24]:
-        shifted_result = find_best_target_string(note_pitch + octave_shift, part_type, 
-                                                 target_tuning, occupied_strings, config, 
-                                                 other_hand_frets, prefer_melody_strings)
+        shifted_result = _score_candidates(note_pitch + octave_shift, target_semi,
+                                           occupied_mask, *placement)
         if shifted_result[0] is not None:
             # Check if in preferred region
-            is_melody_string = shifted_result[0] >= melody_start
-            if (prefer_low and not is_melody_string) or (not prefer_low and is_melody_string):
+            if (shifted_result[0] >= melody_start) != prefer_low:
                 return shifted_result
+        shifted_results.append(shifted_result)
     
     # If we got here, nothing worked in preferred region
     # Accept the original result even if wrong region, or try more octaves as last resort
     if result[0] is not None:
         return result
     
-    # Last resort: try all octave shifts even in wrong region
-    for octave_shift in [12, -12, 24, -24]:
-        shifted_result = find_best_target_string(note_pitch + octave_shift, part_type, 
-                                                 target_tuning, occupied_strings, config, 
-                                                 other_hand_frets, prefer_melody_strings)
+    # Last resort: accept the first octave shift that fit, even in wrong region
+    for shifted_result in shifted_results:
         if shifted_result[0] is not None:
             return shifted_result
     
     return None, None
 
 
+def format_merged_sections(merged_sections, target_tuning):
+    """Yield the output tab lines for merged sections.
+    
+    Lines are produced one at a time so the caller can stream them to a file
+    without building the whole output in memory.
+    
+    Args:
+        merged_sections: List of (target_section, max_col) tuples, where
+            target_section holds a {col: fret} dict per target string
+        target_tuning: List of target tuning notes
+    """
+    num_target_strings = len(target_tuning)
+    target_displays = [note.translate(_DIGIT_DELETE) for note in target_tuning]
+    max_label_width = max(len(d) for d in target_displays)
+    # Padded "label|" prefix for each target string, shared by every section
+    line_prefixes = [d.ljust(max_label_width) + '|' for d in target_displays]
+    
+    for section_idx, (target_section, max_col) in enumerate(merged_sections):
+        if section_idx > 0:
+            yield ""
+        
+        # First pass: determine width needed at each column position
+        # (at least one dash; only columns holding a note can be wider)
+        col_widths = [1] * (max_col + 1)
+        for string_frets in target_section:
+            for col, fret in string_frets.items():
+                width = len(str(fret))  # 'X' is one character wide
+                if width > col_widths[col]:
+                    col_widths[col] = width
+        
+        # Empty cells only depend on the column, so build them once per section
+        empty_cells = ['-' * width for width in col_widths]
+        
+        # Build tab lines for each target string (high to low)
+        for tgt_idx in reversed(range(num_target_strings)):
+            # Build content string with proper spacing, starting from empty
+            # cells and overwriting the columns where this string has a note
+            content = empty_cells[:]
+            for col, fret in target_section[tgt_idx].items():
+                content[col] = str(fret).ljust(col_widths[col], '-')
+            
+            yield line_prefixes[tgt_idx] + ''.join(content)
+
+
 def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=None, verbosity=0):
     """Merge multiple tab files into a single combined tab file."""
     
@@ -345,11 +451,11 @@ def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=No
     num_target_strings = len(target_tuning_list)
     
     # Parse all input files and extract note events
-    all_parts = []  # List of (part_type, sections) tuples
+    all_parts = []  # List of (part_type, source_semi, sections) tuples
     
     for idx, file_path in enumerate(file_paths):
         try:
-            detected_tuning, lines, _ = parse_tab_file(file_path)
+            detected_tuning, sections_raw = parse_tab_file(file_path)
         except Exception as e:
             print(f"Error reading {file_path}: {e}", file=sys.stderr)
             return 1
@@ -375,14 +481,15 @@ def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=No
             print(f"{file_path.name}: {part_type} part (avg pitch {avg_pitch:.1f})")
         
         # Extract note events
-        sections = extract_note_events(lines, source_tuning, verbosity)
-        all_parts.append((part_type, source_tuning, sections))
+        sections = extract_note_events(sections_raw, source_tuning, verbosity)
+        all_parts.append((part_type, source_semi, sections))
         
         if verbosity >= 1:
             print(f"  Found {len(sections)} sections")
     
     # Now merge sections temporally
     # We need to align sections across parts - assume they correspond by index
+    target_semi = parse_tuning(target_tuning_list)
     max_sections = max(len(sections) for _, _, sections in all_parts)
     
     merged_sections = []
@@ -391,29 +498,34 @@ def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=No
         if verbosity >= 2:
             print(f"\nProcessing section {section_idx + 1}/{max_sections}")
         
-        # Collect all note events for this section across all parts
-        section_events = defaultdict(list)  # column -> [(part_type, source_tuning, string_idx, fret)]
-        max_col = 0
+        # Parts that have this section, and the last column any of them uses
+        section_parts = [(part_type, source_semi, sections[section_idx])
+                         for part_type, source_semi, sections in all_parts
+                         if section_idx < len(sections)]
+        max_col = max(col for _, _, section in section_parts for col, _ in section)
         
-        for part_type, source_tuning, sections in all_parts:
-            if section_idx >= len(sections):
-                continue
-            
-            section = sections[section_idx]
-            source_semi = parse_tuning(source_tuning)
-            
+        # Collect all note events for this section across all parts, with a
+        # slot per column so columns come out in order without sorting
+        column_events = [None] * (max_col + 1)  # col -> [(part_type, note_pitch, fret)]
+        
+        for part_type, source_semi, section in section_parts:
+            # Convert the whole section to absolute pitches in one sweep
             for (col, src_string_idx), fret in section.items():
-                source_pitch = source_semi[src_string_idx]
-                note_pitch = source_pitch + fret
-                section_events[col].append((part_type, note_pitch, fret))
-                max_col = max(max_col, col)
+                event = (part_type, source_semi[src_string_idx] + fret, fret)
+                if column_events[col] is None:
+                    column_events[col] = [event]
+                else:
+                    column_events[col].append(event)
         
         # Allocate notes to target strings column by column
-        target_section = defaultdict(dict)  # target_string_idx -> {col: fret}
+        # Indexed by target string; each entry maps col -> fret
+        target_section = [{} for _ in range(num_target_strings)]
         
-        for col in sorted(section_events.keys()):
-            events = section_events[col]
-            occupied_strings = set()
+        for col, events in enumerate(column_events):
+            if events is None:
+                continue
+            
+            occupied_mask = 0  # Bit per target string used in this column
             bass_frets = {}  # For checking hand separation
             melody_frets = {}
             
@@ -429,14 +541,14 @@ def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=No
                     
                     # Find best target string with octave shifting
                     tgt_idx, new_fret = try_octave_shifts(
-                        note_pitch, part_type, target_tuning_list, 
-                        occupied_strings, config, other_hand_frets,
+                        note_pitch, part_type, target_semi, 
+                        occupied_mask, config, other_hand_frets,
                         prefer_melody_strings=(part_type == 'melody')
                     )
                     
                     if tgt_idx is not None:
                         target_section[tgt_idx][col] = new_fret
-                        occupied_strings.add(tgt_idx)
+                        occupied_mask |= 1 << tgt_idx
                         
                         if part_type == 'bass':
                             bass_frets[tgt_idx] = new_fret
@@ -451,61 +563,20 @@ def merge_tab_files(file_paths, output_path, config=None, source_tunings_list=No
                         # Still need to mark it somehow - we'll use a special marker
                         # Find any available string and mark with 'X'
                         for tgt_idx in range(num_target_strings):
-                            if tgt_idx not in occupied_strings:
+                            if not occupied_mask >> tgt_idx & 1:
                                 target_section[tgt_idx][col] = 'X'
-                                occupied_strings.add(tgt_idx)
+                                occupied_mask |= 1 << tgt_idx
                                 break
         
         merged_sections.append((target_section, max_col))
     
-    # Write output
-    merged_lines = []
-    target_displays = [re.sub(r'\d+', '', note) for note in target_tuning_list]
-    max_label_width = max(len(d) for d in target_displays)
-    
-    for section_idx, (target_section, max_col) in enumerate(merged_sections):
-        if section_idx > 0:
-            merged_lines.append("")
-        
-        # First pass: determine width needed at each column position
-        col_widths = {}
-        for col in range(max_col + 1):
-            max_width = 1  # At least one dash
-            for tgt_idx in range(num_target_strings):
-                if tgt_idx in target_section and col in target_section[tgt_idx]:
-                    fret = target_section[tgt_idx][col]
-                    if fret == 'X':
-                        width = 1
-                    else:
-                        width = len(str(fret))
-                    max_width = max(max_width, width)
-            col_widths[col] = max_width
-        
-        # Build tab lines for each target string (high to low)
-        for tgt_idx in reversed(range(num_target_strings)):
-            label = target_displays[tgt_idx].ljust(max_label_width)
-            
-            # Build content string with proper spacing
-            content = []
-            for col in range(max_col + 1):
-                col_width = col_widths[col]
-                
-                if tgt_idx in target_section and col in target_section[tgt_idx]:
-                    fret = target_section[tgt_idx][col]
-                    if fret == 'X':
-                        content.append('X'.ljust(col_width, '-'))
-                    else:
-                        fret_str = str(fret)
-                        content.append(fret_str.ljust(col_width, '-'))
-                else:
-                    content.append('-' * col_width)
-            
-            merged_lines.append(f"{label}|{''.join(content)}")
-    
-    # Write output file
+    # Write output file, formatting each section as it is written
     try:
         with open(output_path, 'w') as f:
-            f.write('\n'.join(merged_lines) + '\n')
+            merged_lines = format_merged_sections(merged_sections, target_tuning_list)
+            f.writelines(line + '\n' for line in merged_lines)
+            if not merged_sections:
+                f.write('\n')  # An empty merge is still one (blank) line
         print(f"\nMerged {len(file_paths)} files into {output_path}")
         print(f"Combined {len(merged_sections)} section(s)")
     except Exception as e: